@@ -1,9 +1,18 @@
 from flask import Flask, request, jsonify
 import numpy as np
 import pandas as pd
-from scipy.optimize import minimize
+from scipy.optimize import minimize, linprog
+from scipy import sparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import math
 import random
+import threading
+
+try:
+    from numba import njit
+except ImportError:  # Numba ist optional, ohne wird die reine NumPy-Variante verwendet
+    njit = None
 
 # --- Konfiguration und Initialisierung ---
 
@@ -26,7 +35,8 @@ def lade_historische_kurse():
     
     start_datum = pd.to_datetime('2020-01-01')
     end_datum = pd.to_datetime('2024-01-01')
-    datumsbereich = pd.date_range(start=start_datum, end=end_datum, freq='D')
+    # Nur Börsentage (Mo-Fr) erzeugen, statt Kalendertage zu simulieren und danach auszudünnen
+    datumsbereich = pd.bdate_range(start=start_datum, end=end_datum)
     
     np.random.seed(42)
     
@@ -35,27 +45,34 @@ def lade_historische_kurse():
     volatilitaeten = np.array([0.015, 0.02, 0.01, 0.03])
     drifts = np.array([0.0002, 0.0001, 0.0003, 0.00005])
     
-    # Erzeuge Kurse mit geometrischer Brown'scher Bewegung
-    kurse = np.zeros((len(datumsbereich), 4))
-    kurse[0] = start_preise
+    # Erzeuge Kurse mit geometrischer Brown'scher Bewegung.
+    # Alle Zufallszahlen in einem Aufruf ziehen: der Zufallsstrom ist derselbe wie bei einem
+    # Aufruf pro Tag, die Kurse unterscheiden sich nur durch Rundung im kumulierten Produkt.
+    # Ein Schritt pro Börsentag: die Kurse hängen vom Seed UND von der Anzahl der Tage ab,
+    # ein anderer Datumsbereich verschiebt also alle simulierten Werte.
+    zufall = np.random.normal(0, 1, (len(datumsbereich) - 1, 4))
+    tagesfaktoren = np.exp(drifts + volatilitaeten * zufall)
     
-    for i in range(1, len(datumsbereich)):
-        # Zufällige Bewegungen
-        zufall = np.random.normal(0, 1, 4)
-        kurse[i] = kurse[i-1] * np.exp(drifts + volatilitaeten * zufall)
+    kurse = np.empty((len(datumsbereich), 4))
+    kurse[0] = start_preise
+    kurse[1:] = start_preise * np.cumprod(tagesfaktoren, axis=0)
         
     df_kurse = pd.DataFrame(kurse, index=datumsbereich, columns=['Asset A (Tech)', 'Asset B (Energy)', 'Asset C (Bonds)', 'Asset D (Gold)'])
     
-    return df_kurse.asfreq('B').ffill() # Nur Börsentage, fehlende Daten vorfüllen
+    return df_kurse
 
 def berechne_historische_parameter(df_kurse):
     """
     Berechnet tägliche Renditen, Mittelwerte und die Kovarianzmatrix.
+    Die Ergebnisse sind NumPy-Arrays (Tage x Assets), da der Optimierer nur damit rechnet.
     """
-    renditen = df_kurse.pct_change().dropna()
-    mittelwerte = renditen.mean()
-    kovarianzmatrix = renditen.cov()
-    asset_namen = renditen.columns.tolist()
+    kurse = df_kurse.to_numpy(dtype=np.float64)
+    
+    # Entspricht pct_change().dropna(): der erste Tag hat keine Vorgänger-Rendite
+    renditen = kurse[1:] / kurse[:-1] - 1.0
+    mittelwerte = renditen.mean(axis=0)
+    kovarianzmatrix = np.cov(renditen, rowvar=False)
+    asset_namen = tuple(df_kurse.columns)
     
     # Skalierung auf jährliche Basis für Mittelwerte (252 Handelstage)
     jaehrliche_mittelwerte = mittelwerte * 252
@@ -69,67 +86,258 @@ def portfolio_return(gewichte, mittelwerte):
     return np.sum(gewichte * mittelwerte)
 
 def portfolio_volatility(gewichte, kovarianzmatrix):
-    """Berechnet die jährliche Portfolio-Volatilität (Standardabweichung)."""
+    """
+    Berechnet die jährliche Portfolio-Volatilität (Standardabweichung).
+    Für Einzelaufrufe; bei vielen Aufrufen mit derselben Kovarianzmatrix (Effizienzgrenze)
+    einmal jaehrlicher_volatilitaetsfaktor berechnen und portfolio_volatility_aus_faktor verwenden.
+    """
     # Kovarianz ist tägliche Kovarianz, muss auf jährlich skaliert werden (sqrt(252))
-    return np.sqrt(np.dot(gewichte.T, np.dot(kovarianzmatrix * 252, gewichte)))
+    return np.sqrt(gewichte @ (kovarianzmatrix * 252) @ gewichte)
+
+def jaehrlicher_volatilitaetsfaktor(kovarianzmatrix):
+    """
+    Faktor F mit F.T @ F = 252 * Kovarianzmatrix (transponierte Cholesky-Zerlegung; die Kovarianz
+    ist täglich und wird auf jährlich skaliert),
+    damit die jährliche Volatilität nur noch ||F @ gewichte|| ist.
+    Ist die Kovarianzmatrix nur positiv semidefinit (z.B. linear abhängige Assets),
+    wird stattdessen die Eigenzerlegung verwendet.
+    """
+    jaehrliche_kovarianz = kovarianzmatrix * 252
+    try:
+        return np.linalg.cholesky(jaehrliche_kovarianz).T
+    except np.linalg.LinAlgError:
+        eigenwerte, eigenvektoren = np.linalg.eigh(jaehrliche_kovarianz)
+        return np.sqrt(np.clip(eigenwerte, 0, None))[:, None] * eigenvektoren.T
+
+def portfolio_volatility_aus_faktor(gewichte, volatilitaetsfaktor):
+    """Jährliche Portfolio-Volatilität ||F @ gewichte|| mit F aus jaehrlicher_volatilitaetsfaktor."""
+    return np.linalg.norm(volatilitaetsfaktor @ gewichte)
+
+def tail_groesse(anzahl_tage, risiko_level):
+    """Anzahl der Tage, die zu den schlechtesten (risiko_level * 100)% der Fälle gehören."""
+    return max(1, int(math.ceil(risiko_level * anzahl_tage)))
 
 def portfolio_value_at_risk(gewichte, renditen, risiko_level):
     """
     Berechnet den historischen Value at Risk (VaR) des Portfolios.
-    VaR ist das Perzentil der schlechtesten Renditen.
+    VaR ist die Grenze des Tails der schlechtesten Renditen.
+    Wird vom Optimierer nicht benötigt, bleibt aber als eigenständige Kennzahl erhalten.
     """
     # Rendite des Portfolios für jeden Tag in der Historie
-    portfolio_renditen = renditen.dot(gewichte)
+    portfolio_renditen = renditen @ gewichte
     
-    # VaR ist das Perzentil der Renditen. 
-    # Wir nehmen den Wert, bei dem die schlechtesten (risiko_level * 100)% der Fälle liegen.
-    var = np.percentile(portfolio_renditen, risiko_level * 100)
+    # VaR ist die k-schlechteste Rendite, also dieselbe Tail-Grenze, die portfolio_cvar verwendet.
+    k = tail_groesse(portfolio_renditen.shape[0], risiko_level)
+    var = np.partition(portfolio_renditen, k - 1)[k - 1]
     return var
 
 def portfolio_cvar(gewichte, renditen, risiko_level):
     """
     Berechnet den Conditional Value at Risk (CVaR) des Portfolios.
     CVaR ist der Durchschnitt der Verluste, die schlimmer sind als VaR.
+    Erwartet die Renditen als NumPy-Array, da diese Funktion im Optimierer
+    sehr häufig aufgerufen wird.
     """
-    portfolio_renditen = renditen.dot(gewichte)
+    # Rendite des Portfolios für jeden Tag (nur ein Matrix-Vektor-Produkt pro Aufruf)
+    portfolio_renditen = renditen @ gewichte
     
-    # VaR: Das Rendite-Level, das nur in (risiko_level * 100)% der Fälle unterschritten wird
-    var = portfolio_value_at_risk(gewichte, renditen, risiko_level)
+    # Anzahl der Tage im Tail, also die schlechtesten (risiko_level * 100)% der Fälle
+    k = tail_groesse(portfolio_renditen.shape[0], risiko_level)
     
-    # CVaR: Durchschnitt aller Renditen, die kleiner oder gleich VaR sind
-    cvar = portfolio_renditen[portfolio_renditen <= var].mean()
+    # CVaR: Durchschnitt der k schlechtesten Renditen. np.partition isoliert sie in O(n),
+    # ohne den VaR vorher per Sortierung (np.percentile) bestimmen zu müssen.
+    tail = np.partition(portfolio_renditen, k - 1)[:k]
+    cvar = tail.mean()
     
     # Da CVaR ein Verlust ist, geben wir es als positiven Wert für die Optimierung zurück (Ziel ist Minimierung)
     return -cvar
 
-def optimiere_portfolio(ziel_rendite, renditen, mittelwerte, kovarianzmatrix, risiko_level):
+def portfolio_cvar_mehrfach(gewichte_matrix, renditen, risiko_level):
     """
-    Führt die CVaR-Minimierung für eine bestimmte Zielrendite durch.
+    Wie portfolio_cvar, aber für mehrere Portfolios auf einmal (eine Spalte je Portfolio).
+    Alle Portfoliorenditen entstehen in einem Matrix-Matrix-Produkt R @ W statt in einem
+    Matrix-Vektor-Produkt pro Portfolio.
+    """
+    portfolio_renditen = renditen @ gewichte_matrix
+    k = tail_groesse(portfolio_renditen.shape[0], risiko_level)
+    tail = np.partition(portfolio_renditen, k - 1, axis=0)[:k]
+    return -tail.mean(axis=0)
+
+def _cvar_und_gradient_numpy(renditen, gewichte, k):
+    """CVaR und Gradient über die k schlechtesten Tage, vektorisiert mit NumPy."""
+    portfolio_renditen = renditen @ gewichte
+    
+    # Indizes der k schlechtesten Tage statt nur deren Werte
+    tail_tage = np.argpartition(portfolio_renditen, k - 1)[:k]
+    tail_renditen = renditen[tail_tage]
+    
+    # Summation immer in float64, auch wenn die Renditen als float32 vorliegen
+    cvar = -portfolio_renditen[tail_tage].mean(dtype=np.float64)
+    gradient = -tail_renditen.mean(axis=0, dtype=np.float64)
+    return cvar, gradient
+
+def _cvar_und_gradient_schleife(renditen, gewichte, k):
+    """
+    Wie _cvar_und_gradient_numpy, aber als explizite Schleife für Numba formuliert
+    (np.argpartition wird von Numba nicht unterstützt).
+    """
+    anzahl_tage, num_assets = renditen.shape
+    portfolio_renditen = renditen @ gewichte
+    var = np.partition(portfolio_renditen, k - 1)[k - 1]
+    
+    summe = 0.0
+    gradient = np.zeros(num_assets)
+    anzahl = 0
+    
+    # Alle Tage echt unterhalb des VaR gehören zum Tail ...
+    for i in range(anzahl_tage):
+        if portfolio_renditen[i] < var:
+            summe += portfolio_renditen[i]
+            for j in range(num_assets):
+                gradient[j] += renditen[i, j]
+            anzahl += 1
+    
+    # ... aufgefüllt mit Tagen genau auf dem VaR, bis k Tage erreicht sind
+    for i in range(anzahl_tage):
+        if anzahl >= k:
+            break
+        if portfolio_renditen[i] == var:
+            summe += portfolio_renditen[i]
+            for j in range(num_assets):
+                gradient[j] += renditen[i, j]
+            anzahl += 1
+    
+    return -summe / k, -gradient / k
+
+if njit is not None:
+    # Einmal kompiliert und auf der Platte gecacht, danach ohne Interpreter-Overhead.
+    # njit kompiliert erst beim ersten Aufruf (je Datentyp und Layout), nicht beim Import:
+    # Import und Tests, die den Kernel nicht brauchen, zahlen die Kompilierung nicht.
+    _cvar_und_gradient = njit(cache=True, fastmath=True)(_cvar_und_gradient_schleife)
+else:
+    _cvar_und_gradient = _cvar_und_gradient_numpy
+
+def _cvar_ziel(gewichte, renditen, k):
+    """
+    SLSQP-Zielfunktion: rechnet im Datentyp der Renditematrix (float32),
+    gibt Wert und Gradient aber als float64 an SciPy zurück.
+    """
+    cvar, gradient = _cvar_und_gradient(renditen, gewichte.astype(renditen.dtype), k)
+    return float(cvar), gradient.astype(np.float64)
+
+def _summe_gewichte_minus_eins(gewichte):
+    """Gleichheitsbedingung der Vollständigen Investition: Summe der Gewichte - 1 = 0."""
+    return np.sum(gewichte) - 1
+
+def _summe_gewichte_jacobi(gewichte):
+    """Konstante Jacobi-Matrix von _summe_gewichte_minus_eins."""
+    return np.ones(gewichte.shape[0])
+
+def _rendite_ueber_ziel(gewichte, mittelwerte, ziel_rendite):
+    """Ungleichheitsbedingung: erwartete Portfoliorendite - Zielrendite >= 0."""
+    return portfolio_return(gewichte, mittelwerte) - ziel_rendite
+
+def _rendite_ueber_ziel_jacobi(gewichte, mittelwerte, ziel_rendite):
+    """Konstante Jacobi-Matrix von _rendite_ueber_ziel."""
+    return mittelwerte
+
+def _erfolgreiches_ergebnis(gewichte, cvar_wert, mittelwerte, volatilitaetsfaktor):
+    """Baut das Ergebnis-Dictionary einer erfolgreichen Optimierung auf."""
+    return {
+        "erfolgreich": True,
+        "gewichte": gewichte.tolist(),
+        "rendite": portfolio_return(gewichte, mittelwerte),
+        "volatilitaet": portfolio_volatility_aus_faktor(gewichte, volatilitaetsfaktor),
+        # CVaR wird hier als negativer Wert zurückgegeben, da die Funktion ihn für die Minimierung negativ macht.
+        # Wir geben den tatsächlichen Wert (Verlust) zurück.
+        "cvar": cvar_wert
+    }
+
+def _optimiere_portfolio_lp(ziel_rendite, renditen, mittelwerte, volatilitaetsfaktor, risiko_level):
+    """
+    CVaR-Minimierung als lineares Programm nach Rockafellar-Uryasev:
+        min  alpha + 1/k * Summe(u_t)
+        u_t >= -r_t·w - alpha,  u_t >= 0,  Summe(w) = 1,  w·mu >= Zielrendite,  0 <= w <= 1
+    Mit k = Anzahl der Tail-Tage ist der Optimalwert genau der CVaR aus portfolio_cvar.
+    """
+    anzahl_tage, num_assets = renditen.shape
+    k = tail_groesse(anzahl_tage, risiko_level)
+    
+    # Variablen: x = [w (num_assets), alpha (1), u (anzahl_tage)]
+    c = np.concatenate([np.zeros(num_assets), [1.0], np.full(anzahl_tage, 1.0 / k)])
+    
+    # -r_t·w - alpha - u_t <= 0 für jeden Tag, -mu·w <= -Zielrendite
+    A_ub = sparse.vstack([
+        sparse.hstack([sparse.csr_matrix(-renditen), -np.ones((anzahl_tage, 1)), -sparse.identity(anzahl_tage)]),
+        sparse.csr_matrix(np.concatenate([-mittelwerte, np.zeros(1 + anzahl_tage)]))
+    ], format='csr')
+    b_ub = np.concatenate([np.zeros(anzahl_tage), [-ziel_rendite]])
+    
+    # Summe der Gewichte muss 1 ergeben (Vollständige Investition)
+    A_eq = sparse.csr_matrix(np.concatenate([np.ones(num_assets), np.zeros(1 + anzahl_tage)]))
+    b_eq = [1.0]
+    
+    # Kein Leerverkauf, alpha (entspricht dem VaR-Verlust) frei, Überschreitungen u_t nicht negativ
+    bounds = [(0, 1)] * num_assets + [(None, None)] + [(0, None)] * anzahl_tage
+    
+    ergebnis = linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq, bounds=bounds, method='highs')
+    
+    if ergebnis.success:
+        gewichte = ergebnis.x[:num_assets]
+        # Im Optimum ist der Zielfunktionswert genau der CVaR der Gewichte (Rockafellar-Uryasev)
+        return _erfolgreiches_ergebnis(gewichte, ergebnis.fun, mittelwerte, volatilitaetsfaktor)
+    else:
+        return {"erfolgreich": False, "fehlermeldung": ergebnis.message}
+
+def _optimiere_portfolio_slsqp(ziel_rendite, renditen, mittelwerte, volatilitaetsfaktor, risiko_level,
+                               startgewichte=None):
+    """
+    Direkte Minimierung des (nicht glatten) CVaR mit SLSQP.
+    startgewichte: Startpunkt der Suche, ohne Angabe die gleichgewichtete Aufteilung.
     """
     num_assets = len(mittelwerte)
     
+    # Tail-Größe des CVaR ist für alle Auswertungen dieser Optimierung gleich
+    k = tail_groesse(renditen.shape[0], risiko_level)
+    
     # 1. Nebenbedingungen (Constraints) - KORRIGIERTER BLOCK
-    # Wir definieren constraints als Liste von Dictionaries
+    # Wir definieren constraints als Liste von Dictionaries.
+    # Beide sind linear, daher geben wir die (konstanten) Jacobi-Matrizen direkt mit.
+    # Funktionen auf Modulebene mit 'args' statt Lambdas: keine Closure pro Optimierung.
     constraints = [
         # C1: Summe der Gewichte muss 1 ergeben (Vollständige Investition)
-        {'type': 'eq', 'fun': lambda gewichte: np.sum(gewichte) - 1},
+        {'type': 'eq', 'fun': _summe_gewichte_minus_eins, 'jac': _summe_gewichte_jacobi},
         
         # C2: Die erwartete Portfoliorendite muss mindestens der Zielrendite entsprechen
-        {'type': 'ineq', 'fun': lambda gewichte: portfolio_return(gewichte, mittelwerte) - ziel_rendite}
+        {'type': 'ineq', 'fun': _rendite_ueber_ziel, 'jac': _rendite_ueber_ziel_jacobi,
+         'args': (mittelwerte, ziel_rendite)}
     ]
     
     # 2. Bindung (Bounds): Gewichte müssen zwischen 0 und 1 liegen (kein Leerverkauf)
     bounds = tuple((0, 1) for asset in range(num_assets))
     
-    # 3. Startwerte: Gleichgewichtete Aufteilung
-    initial_gewichte = np.array([1 / num_assets] * num_assets)
+    # 3. Startwerte: vorgegebene Gewichte (z.B. der Nachbarpunkt auf der Grenze),
+    # sonst gleichgewichtete Aufteilung
+    if startgewichte is not None:
+        initial_gewichte = np.asarray(startgewichte, dtype=np.float64)
+    else:
+        initial_gewichte = np.array([1 / num_assets] * num_assets)
     
     # 4. Minimierungsfunktion: CVaR soll minimiert werden
-    # Führt die Optimierung durch (Sequential Least Squares Programming)
+    # Die Zielfunktion rechnet R @ w in float32: halbe Speicherbandbreite für das dominierende
+    # Matrix-Vektor-Produkt, der CVaR bleibt auf ~1e-7 relativ genau, was für die Grenze reicht.
+    # Mittelwerte/Kovarianz bleiben float64; der zurückgegebene CVaR ist der Zielfunktionswert
+    # (in float64 summiert) und damit ebenso genau.
+    renditen_f32 = renditen.astype(np.float32, order='F')
+    
+    # Führt die Optimierung durch (Sequential Least Squares Programming).
+    # jac=True: die Zielfunktion liefert (Wert, Gradient) in einem Aufruf.
     ergebnis = minimize(
-        lambda gewichte: portfolio_cvar(gewichte, renditen, risiko_level),
+        _cvar_ziel,
         initial_gewichte, 
+        args=(renditen_f32, k),
         method='SLSQP', 
+        jac=True,
         bounds=bounds, 
         constraints=constraints # Übergabe der korrigierten Liste
     )
@@ -137,60 +345,221 @@ def optimiere_portfolio(ziel_rendite, renditen, mittelwerte, kovarianzmatrix, ri
     # Prüfe auf Erfolg
     if ergebnis.success:
         gewichte = ergebnis.x
-        volatilitaet = portfolio_volatility(gewichte, kovarianzmatrix)
-        cvar_wert = portfolio_cvar(gewichte, renditen, risiko_level)
-        
-        return {
-            "erfolgreich": True,
-            "gewichte": gewichte.tolist(),
-            "rendite": portfolio_return(gewichte, mittelwerte),
-            "volatilitaet": volatilitaet,
-            # CVaR wird hier als negativer Wert zurückgegeben, da die Funktion ihn für die Minimierung negativ macht.
-            # Wir geben den tatsächlichen Wert (Verlust) zurück.
-            "cvar": cvar_wert 
-        }
+        # ergebnis.fun ist der CVaR an den finalen Gewichten, keine erneute Auswertung nötig
+        return _erfolgreiches_ergebnis(gewichte, ergebnis.fun, mittelwerte, volatilitaetsfaktor)
     else:
         return {"erfolgreich": False, "fehlermeldung": ergebnis.message}
 
-def berechne_cvar_effizienzgrenze(renditen, mittelwerte, kovarianzmatrix, risiko_level, schritte=50):
+def optimiere_portfolio(ziel_rendite, renditen, mittelwerte, kovarianzmatrix, risiko_level, methode='slsqp',
+                        startgewichte=None):
+    """
+    Führt die CVaR-Minimierung für eine bestimmte Zielrendite durch.
+    renditen (Tage x Assets), mittelwerte und kovarianzmatrix sind NumPy-Arrays.
+    methode='slsqp' minimiert den CVaR direkt mit SLSQP (Standard, weil mit analytischem Gradienten
+    etwa zehnmal schneller; der CVaR liegt dabei teils bis ~0.15% über dem Optimum),
+    methode='lp' löst die lineare Umformulierung mit HiGHS und liefert garantiert das globale Optimum.
+    startgewichte setzt den Startpunkt von SLSQP (Standard: gleichgewichtet); das LP braucht keinen.
+    """
+    volatilitaetsfaktor = jaehrlicher_volatilitaetsfaktor(kovarianzmatrix)
+    return _optimiere_portfolio(ziel_rendite, renditen, mittelwerte, volatilitaetsfaktor, risiko_level, methode,
+                                startgewichte)
+
+def _optimiere_portfolio(ziel_rendite, renditen, mittelwerte, volatilitaetsfaktor, risiko_level, methode,
+                         startgewichte=None):
+    """Wie optimiere_portfolio, aber mit bereits zerlegter Kovarianzmatrix (für wiederholte Aufrufe)."""
+    if methode == 'slsqp':
+        return _optimiere_portfolio_slsqp(ziel_rendite, renditen, mittelwerte, volatilitaetsfaktor, risiko_level,
+                                          startgewichte)
+    if methode == 'lp':
+        return _optimiere_portfolio_lp(ziel_rendite, renditen, mittelwerte, volatilitaetsfaktor, risiko_level)
+    raise ValueError(f"Unbekannte Optimierungsmethode: {methode}")
+
+def _berechne_teilgrenze(ziel_renditen, renditen, mittelwerte, volatilitaetsfaktor, risiko_level, methode,
+                         startgewichte=None):
+    """
+    Optimiert einen zusammenhängenden Block von Zielrenditen nacheinander, jeden Punkt ab dem
+    vorherigen; der erste startet bei startgewichte (ohne Angabe gleichgewichtet).
+    Läuft als Aufgabe in einem Worker-Prozess, muss daher auf Modulebene liegen (pickle).
+    """
+    ergebnisse = []
+    vorherige_gewichte = startgewichte
+    
+    for ziel in ziel_renditen:
+        # Benachbarte Zielrenditen haben fast dieselben optimalen Gewichte: mit dem letzten
+        # erfolgreichen Punkt starten (Fortsetzungsverfahren) statt jedes Mal gleichgewichtet
+        optimierung = _optimiere_portfolio(ziel, renditen, mittelwerte, volatilitaetsfaktor, risiko_level, methode,
+                                           vorherige_gewichte)
+        if optimierung["erfolgreich"]:
+            vorherige_gewichte = optimierung["gewichte"]
+        ergebnisse.append(optimierung)
+    
+    return ergebnisse
+
+def berechne_cvar_effizienzgrenze(renditen, mittelwerte, kovarianzmatrix, risiko_level, schritte=50, max_prozesse=1,
+                                  methode='slsqp'):
     """
     Berechnet die CVaR-Effizienzgrenze durch Optimierung für eine Reihe von Zielrenditen.
+    Standardmäßig im aktuellen Prozess: die ganze Grenze dauert nur Millisekunden, ein
+    Prozess-Pool kostet mehr, als er spart. Mit max_prozesse > 1 werden die Zielrenditen
+    blockweise auf so viele Prozesse verteilt. methode wie bei optimiere_portfolio.
+    Jeder Punkt startet SLSQP bei den Gewichten des vorherigen, die Ergebnisse hängen also vom
+    Startpunkt ab: bei gleichem max_prozesse ist die Grenze auf jeder Maschine dieselbe, zwischen
+    verschiedenen max_prozesse können sich die Gewichte leicht unterscheiden.
     """
-    # Definiere den Bereich der Zielrenditen
-    min_rendite = np.min(mittelwerte) * 0.9 # Etwas niedriger als der schlechteste Asset
-    max_rendite = np.max(mittelwerte) * 1.1 # Etwas höher als der beste Asset
+    # Definiere den Bereich der Zielrenditen. Ohne Leerverkauf ist keine Rendite über der des
+    # besten Assets erreichbar; solche Ziele ließen SLSQP nur bis zum Iterationslimit laufen.
+    min_rendite = np.min(mittelwerte) # Rendite des schlechtesten Assets
+    max_rendite = np.max(mittelwerte) # Rendite des besten Assets, noch erreichbar (100% in diesem Asset)
+    
+    # Kovarianzmatrix einmal für die ganze Grenze zerlegen statt für jeden Punkt neu zu skalieren
+    volatilitaetsfaktor = jaehrlicher_volatilitaetsfaktor(kovarianzmatrix)
+    
+    # Bei der kleinsten Zielrendite ist die Renditebedingung nicht bindend: das Ergebnis ist das
+    # Portfolio mit minimalem CVaR. Jede Zielrendite unterhalb seiner Rendite liefert wieder
+    # genau dieses Portfolio, daher beginnt das Raster erst bei dessen Rendite.
+    min_cvar_portfolio = _optimiere_portfolio(min_rendite, renditen, mittelwerte, volatilitaetsfaktor,
+                                              risiko_level, methode)
+    
+    if min_cvar_portfolio["erfolgreich"]:
+        start_rendite = min(max(min_cvar_portfolio["rendite"], min_rendite), max_rendite)
+        startpunkte = [min_cvar_portfolio]
+        startgewichte = min_cvar_portfolio["gewichte"]
+        # Der erste Rasterpunkt ist das bereits berechnete Portfolio mit minimalem CVaR
+        ziel_renditen = np.linspace(start_rendite, max_rendite, schritte)[1:]
+    else:
+        startpunkte = []
+        startgewichte = None
+        ziel_renditen = np.linspace(min_rendite, max_rendite, schritte)
+    
+    # Ein zusammenhängender Block pro Prozess, leere Blöcke (mehr Prozesse als Schritte) entfallen.
+    # Die Aufteilung hängt nur von max_prozesse ab, nicht von der Anzahl der CPU-Kerne.
+    anzahl_prozesse = max(1, max_prozesse or 1)
+    bloecke = [block for block in np.array_split(ziel_renditen, anzahl_prozesse) if block.size]
     
-    ziel_renditen = np.linspace(min_rendite, max_rendite, schritte)
+    # Der erste Block setzt beim Portfolio mit minimalem CVaR fort; die übrigen Blöcke kennen
+    # ihren Vorgänger nicht und starten gleichgewichtet
+    block_startgewichte = [startgewichte] + [None] * (len(bloecke) - 1)
+    
+    if len(bloecke) > 1:
+        with ProcessPoolExecutor(max_workers=len(bloecke)) as executor:
+            teilergebnisse = list(executor.map(
+                _berechne_teilgrenze, bloecke,
+                repeat(renditen), repeat(mittelwerte), repeat(volatilitaetsfaktor), repeat(risiko_level), repeat(methode),
+                block_startgewichte
+            ))
+    else:
+        # Ein Prozess: kein Pool, direkt im aktuellen Prozess rechnen
+        teilergebnisse = [_berechne_teilgrenze(ziel_renditen, renditen, mittelwerte, volatilitaetsfaktor, risiko_level, methode,
+                                               startgewichte)]
+    
+    # executor.map behält die Reihenfolge der Blöcke bei, die Grenze bleibt nach Zielrendite sortiert
+    erfolgreiche = startpunkte + [o for teil in teilergebnisse for o in teil if o["erfolgreich"]]
+    
+    if not erfolgreiche:
+        return []
+    
+    # Plausibilitätsprüfung: die CVaR-Werte der Optimierer (SLSQP rechnet in float32) mit einer
+    # gemeinsamen float64-Auswertung vergleichen (ein R @ W für alle Gewichte statt eines R @ w je Punkt)
+    gewichte_matrix = np.column_stack([o["gewichte"] for o in erfolgreiche])
+    kontrolle = portfolio_cvar_mehrfach(gewichte_matrix, renditen, risiko_level)
+    risiken = np.array([o["cvar"] for o in erfolgreiche])
+    if not np.allclose(risiken, kontrolle, rtol=1e-5, atol=1e-9):
+        abweichung = np.max(np.abs(risiken - kontrolle))
+        print(f"WARNUNG: CVaR der Effizienzgrenze weicht um bis zu {abweichung:.3g} von der Nachrechnung ab.")
     
     effizienzgrenze = []
     
-    for ziel in ziel_renditen:
-        optimierung = optimiere_portfolio(ziel, renditen, mittelwerte, kovarianzmatrix, risiko_level)
-        
-        if optimierung["erfolgreich"]:
-            effizienzgrenze.append({
-                "rendite": optimierung["rendite"],
-                "risiko": optimierung["cvar"],
-                "gewichte": optimierung["gewichte"]
-            })
+    for optimierung in erfolgreiche:
+        effizienzgrenze.append({
+            "rendite": optimierung["rendite"],
+            "risiko": optimierung["cvar"],
+            "gewichte": optimierung["gewichte"]
+        })
             
     return effizienzgrenze
 
-# --- Globale Initialisierung der Parameter (wird beim Import durch Gunicorn ausgeführt) ---
+# --- Initialisierung der Parameter (einmal pro Prozess, beim ersten Bedarf) ---
 
-try:
-    KURSE = lade_historische_kurse()
-    RENDITEN, MITTELWERTE, KOVARIANZMATRIX, ASSET_NAMEN = berechne_historische_parameter(KURSE)
+def _berechne_finanzdaten():
+    """
+    Lädt die Kurse, berechnet die Parameter und die Effizienzgrenze und gibt genau das zurück,
+    was die API pro Anfrage braucht. Rechenintensiv (Optimierung der ganzen Grenze).
+    """
+    kurse = lade_historische_kurse()
+    renditen, mu, kovarianzmatrix, asset_namen = berechne_historische_parameter(kurse)
+    
+    # Renditematrix als float64-Array (Tage x Assets); die Rechenfunktionen sehen nur die Matrix,
+    # Asset-Namen liegen getrennt davon.
+    # Fortran-Ordnung: jede Asset-Spalte liegt zusammenhängend im Speicher, das schmale
+    # R @ w (Tage x 4) läuft damit in BLAS (dgemv) mit Einheitsschrittweite.
+    r_matrix = np.asfortranarray(renditen)
+    
+    effizienzgrenze = berechne_cvar_effizienzgrenze(r_matrix, mu, kovarianzmatrix, RISIKO_LEVEL)
     
-    # Berechne die Effizienzgrenze nur einmal beim Start
-    EFFIZIENZ_GRENZE = berechne_cvar_effizienzgrenze(RENDITEN, MITTELWERTE, KOVARIANZMATRIX, RISIKO_LEVEL)
+    # Nach Rendite sortiert (stabil, Gleichstände in ursprünglicher Reihenfolge) für die Binärsuche
+    reihenfolge = np.argsort([p['rendite'] for p in effizienzgrenze], kind='stable')
+    grenze_sortiert = [effizienzgrenze[i] for i in reihenfolge]
     
-    print("FINANZDATEN ERFOLGREICH INITIALISIERT UND CVAR-GRENZE BERECHNET.")
+    # Nur was die API pro Anfrage liest; Kurse, Renditen und Parameter werden nach der
+    # Berechnung der Grenze nicht mehr gebraucht
+    return {
+        "asset_namen": asset_namen,
+        "effizienzgrenze": effizienzgrenze,
+        # Die Effizienzgrenze ändert sich nach der Berechnung nicht mehr: den gerundeten Teil der
+        # API-Antwort und die Renditen für die Suche nach dem nächsten Punkt einmalig aufbereiten
+        "effizienzgrenze_json": [
+            {"rendite": round(p['rendite'] * 100, 2), "risiko": round(abs(p['risiko']) * 100, 2)}
+            for p in effizienzgrenze
+        ],
+        "grenze_sortiert": grenze_sortiert,
+        "grenze_renditen": np.array([p['rendite'] for p in grenze_sortiert]),
+    }
 
-except Exception as e:
-    # Fehler beim Laden/Berechnen der Daten, was den Gunicorn-Start verhindern würde
-    print(f"KRITISCHER FEHLER BEIM INITIALISIEREN DER FINANZDATEN: {e}")
-    # In einer realen Umgebung würde man hier einen Health Check Failed zurückgeben
+_FINANZDATEN = None
+_FINANZDATEN_FEHLGESCHLAGEN = False
+_FINANZDATEN_LOCK = threading.Lock()
+
+def finanzdaten():
+    """
+    Gibt die Finanzdaten und die Effizienzgrenze zurück und berechnet sie beim ersten Aufruf.
+    Der Import des Moduls lädt nur die Bibliotheken (Numba, falls installiert) und definiert die
+    Funktionen; Daten, Grenze und die Numba-Kompilierung des CVaR-Kernels folgen erst hier.
+    Gunicorn kann die Berechnung mit preload_app einmal im Master ausführen (siehe
+    gunicorn.conf.py), die Worker teilen das Ergebnis per Copy-on-Write.
+    Gibt None zurück, wenn die Berechnung fehlschlägt. Der Fehler wird gemerkt: die Berechnung
+    ist deterministisch, ein neuer Versuch pro Anfrage würde nur alle Anfragen blockieren.
+    """
+    global _FINANZDATEN, _FINANZDATEN_FEHLGESCHLAGEN
+    
+    # Parallele Anfragen (Threads) sollen die Grenze nicht mehrfach berechnen
+    with _FINANZDATEN_LOCK:
+        if _FINANZDATEN is None and not _FINANZDATEN_FEHLGESCHLAGEN:
+            try:
+                _FINANZDATEN = _berechne_finanzdaten()
+                print("FINANZDATEN ERFOLGREICH INITIALISIERT UND CVAR-GRENZE BERECHNET.")
+            except Exception as e:
+                # Fehler beim Laden/Berechnen der Daten
+                _FINANZDATEN_FEHLGESCHLAGEN = True
+                print(f"KRITISCHER FEHLER BEIM INITIALISIEREN DER FINANZDATEN: {e}")
+                # In einer realen Umgebung würde man hier einen Health Check Failed zurückgeben
+        return _FINANZDATEN
+
+def finde_naechsten_grenzpunkt(finanz, ziel_rendite):
+    """
+    Gibt den Punkt der Effizienzgrenze zurück, dessen Rendite der Zielrendite am nächsten liegt.
+    Binärsuche über die sortierten Renditen; bei gleichem Abstand gewinnt die kleinere Rendite.
+    finanz sind die Daten aus finanzdaten().
+    Erwartet eine endliche Zielrendite (NaN/inf weist optimieren_api vorher ab).
+    """
+    renditen = finanz["grenze_renditen"]
+    index = min(int(np.searchsorted(renditen, ziel_rendite)), len(renditen) - 1)
+    
+    # Der linke Nachbar des Einfügepunkts kann näher (oder gleich nah) liegen
+    if index > 0 and ziel_rendite - renditen[index - 1] <= renditen[index] - ziel_rendite:
+        # Bei mehrfach vorkommender Rendite den ersten Punkt mit diesem Wert nehmen
+        index = int(np.searchsorted(renditen, renditen[index - 1]))
+    
+    return finanz["grenze_sortiert"][index]
 
 # --- Flask-Routen ---
 
@@ -206,7 +575,9 @@ def optimieren_api():
     gewünschten Zielrendite.
     """
     
-    if not EFFIZIENZ_GRENZE:
+    finanz = finanzdaten()
+    
+    if not finanz or not finanz["effizienzgrenze"]:
          return jsonify({"error": "Finanzdaten konnten nicht initialisiert werden. Bitte Server-Logs prüfen."}), 500
 
     try:
@@ -216,39 +587,29 @@ def optimieren_api():
         # Rendite von Prozent (z.B. 0.10) in Dezimalzahl (0.10) umwandeln
         ziel_rendite = float(ziel_rendite_prozent)
         
+        # NaN/inf haben keinen nächstgelegenen Punkt auf der Effizienzgrenze
+        if not math.isfinite(ziel_rendite):
+            return jsonify({"error": "Optimierung fehlgeschlagen oder Zielrendite nicht erreichbar."}), 400
+        
         # Finde den nächstgelegenen Punkt auf der Effizienzgrenze für die Zielrendite
         # Dies ist schneller, als jedes Mal neu zu optimieren
+        beste_option = finde_naechsten_grenzpunkt(finanz, ziel_rendite)
         
-        beste_option = None
-        min_differenz = float('inf')
-        
-        for punkt in EFFIZIENZ_GRENZE:
-            differenz = abs(punkt['rendite'] - ziel_rendite)
-            if differenz < min_differenz:
-                min_differenz = differenz
-                beste_option = punkt
+        # Bereite die finale Antwort auf
+        asset_namen = finanz["asset_namen"]
+        gewichtung_dict = {
+            asset_namen[i]: round(gewichte * 100, 2) 
+            for i, gewichte in enumerate(beste_option["gewichte"])
+        }
         
-        if beste_option:
-            # Bereite die finale Antwort auf
-            gewichtung_dict = {
-                ASSET_NAMEN[i]: round(gewichte * 100, 2) 
-                for i, gewichte in enumerate(beste_option["gewichte"])
-            }
-            
-            antwort = {
-                "erwarteteRendite": round(beste_option["rendite"] * 100, 2),
-                "cvarRisiko": round(abs(beste_option["risiko"]) * 100, 2), # CVaR als positiven Verlust anzeigen
-                "gewichtung": gewichtung_dict,
-                "assetNamen": ASSET_NAMEN,
-                "effizienzGrenze": [
-                    {"rendite": round(p['rendite'] * 100, 2), "risiko": round(abs(p['risiko']) * 100, 2)} 
-                    for p in EFFIZIENZ_GRENZE
-                ]
-            }
-            return jsonify(antwort)
-            
-        else:
-            return jsonify({"error": "Optimierung fehlgeschlagen oder Zielrendite nicht erreichbar."}), 400
+        antwort = {
+            "erwarteteRendite": round(beste_option["rendite"] * 100, 2),
+            "cvarRisiko": round(abs(beste_option["risiko"]) * 100, 2), # CVaR als positiven Verlust anzeigen
+            "gewichtung": gewichtung_dict,
+            "assetNamen": asset_namen,
+            "effizienzGrenze": finanz["effizienzgrenze_json"]
+        }
+        return jsonify(antwort)
 
     except Exception as e:
         # Rückgabe eines generischen Fehlers
@@ -257,5 +618,6 @@ def optimieren_api():
 
 # Wenn die App lokal gestartet wird (nicht über Gunicorn)
 if __name__ == '__main__':
+    finanzdaten() # Grenze vor der ersten Anfrage berechnen
     app.run(debug=True)
 
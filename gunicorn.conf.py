@@ -0,0 +1,9 @@
+# Gunicorn-Konfiguration (wird beim Start aus dem Arbeitsverzeichnis automatisch geladen)
+
+# App einmal im Master laden, bevor die Worker geforkt werden
+preload_app = True
+
+def on_starting(server):
+    """Berechnet die Effizienzgrenze einmal im Master; die Worker erben sie per Copy-on-Write."""
+    import app
+    app.finanzdaten()
@@ -0,0 +1,77 @@
+import numpy as np
+
+from app import (
+    _cvar_und_gradient,
+    _cvar_und_gradient_numpy,
+    _cvar_und_gradient_schleife,
+    finde_naechsten_grenzpunkt,
+    portfolio_cvar,
+    tail_groesse,
+)
+
+
+def _grenze(renditen):
+    """Minimale finanzdaten()-Struktur für finde_naechsten_grenzpunkt (bereits nach Rendite sortiert)."""
+    grenze_sortiert = [{"rendite": r, "id": i} for i, r in enumerate(renditen)]
+    return {"grenze_sortiert": grenze_sortiert, "grenze_renditen": np.array(renditen)}
+
+
+def _naechster_per_argmin(finanz, ziel_rendite):
+    """Referenz: lineare Suche, bei gleichem Abstand der erste (kleinste Rendite, erster Duplikat-Punkt)."""
+    abstaende = np.abs(finanz["grenze_renditen"] - ziel_rendite)
+    return finanz["grenze_sortiert"][int(np.argmin(abstaende))]
+
+
+def test_finde_naechsten_grenzpunkt_entspricht_argmin():
+    rng = np.random.default_rng(0)
+    # Doppelte Renditen und gleichmäßige Abstände erzeugen Gleichstände
+    renditen = sorted(np.round(rng.uniform(0.0, 0.3, 40), 2).tolist() + [0.1, 0.1, 0.2])
+    finanz = _grenze(renditen)
+
+    mittelpunkte = [(a + b) / 2 for a, b in zip(renditen, renditen[1:])]
+    ziele = np.concatenate([
+        rng.uniform(-0.1, 0.4, 20000), renditen, mittelpunkte, [-1e9, 1e9],
+    ])
+
+    for ziel in ziele:
+        assert finde_naechsten_grenzpunkt(finanz, ziel)["id"] == _naechster_per_argmin(finanz, ziel)["id"]
+
+
+def test_finde_naechsten_grenzpunkt_einzelner_punkt():
+    finanz = _grenze([0.05])
+    assert finde_naechsten_grenzpunkt(finanz, -1.0)["id"] == 0
+    assert finde_naechsten_grenzpunkt(finanz, 1.0)["id"] == 0
+
+
+def _renditen_mit_gleichstaenden(rng, anzahl_tage=200, num_assets=4):
+    """float32-Renditen in Fortran-Ordnung wie in SLSQP, mit doppelten Zeilen (Gleichstände am VaR)."""
+    renditen = rng.normal(0.0, 0.02, (anzahl_tage, num_assets)).astype(np.float32)
+    doppelte = rng.choice(anzahl_tage, anzahl_tage // 4, replace=False)
+    renditen[doppelte] = renditen[rng.choice(anzahl_tage, doppelte.size)]
+    return np.asfortranarray(renditen)
+
+
+def test_cvar_kernel_schleife_entspricht_numpy():
+    rng = np.random.default_rng(1)
+    k = tail_groesse(200, 0.05)
+
+    for _ in range(50):
+        renditen = _renditen_mit_gleichstaenden(rng)
+        gewichte = rng.dirichlet(np.ones(4)).astype(np.float32)
+        cvar_numpy, gradient_numpy = _cvar_und_gradient_numpy(renditen, gewichte, k)
+
+        # Reine Python-Schleife und der aktive Kernel (mit Numba kompiliert, sonst NumPy)
+        for kernel in (_cvar_und_gradient_schleife, _cvar_und_gradient):
+            cvar, gradient = kernel(renditen, gewichte, k)
+            np.testing.assert_allclose(cvar, cvar_numpy, rtol=1e-5, atol=1e-7)
+            np.testing.assert_allclose(gradient, gradient_numpy, rtol=1e-5, atol=1e-7)
+
+
+def test_portfolio_cvar_entspricht_kernel():
+    rng = np.random.default_rng(2)
+    renditen = np.asfortranarray(rng.normal(0.0, 0.02, (500, 4)))
+    gewichte = rng.dirichlet(np.ones(4))
+    k = tail_groesse(renditen.shape[0], 0.05)
+
+    cvar, _ = _cvar_und_gradient(renditen, gewichte, k)
+    np.testing.assert_allclose(portfolio_cvar(gewichte, renditen, 0.05), cvar, rtol=1e-10)